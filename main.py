@@ -1,15 +1,112 @@
-from utils import YouTubeTranscriptAgent, create_youtube_embed_url, format_time 
+import os
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from utils import YouTubeTranscriptAgent, create_youtube_embed_url, extract_video_id, fetch_audio, format_time, format_timestamp, load_model, plan_model
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import nltk
 
 
 
-# Download NLTK data if not already present
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
+# Minimum seconds between redraws of the live transcript preview
+STREAM_REFRESH_SECONDS = 0.5
 
+# Pinned NLTK data directory; container images pre-download punkt_tab here at build time
+NLTK_DATA_DIR = os.environ.get("NLTK_DATA", "/app/nltk_data")
+
+
+@st.cache_resource(show_spinner=False)
+def _ensure_nltk():
+    """Make the Punkt tokenizer available, once per process rather than on every rerun."""
+    nltk.data.path.insert(0, NLTK_DATA_DIR)
+    try:
+        nltk.data.find('tokenizers/punkt_tab')
+    except LookupError:
+        # Not baked into an image (e.g. a local checkout), so fetch it once
+        nltk.download('punkt_tab', quiet=True)
+
+
+_ensure_nltk()
+
+
+
+@st.cache_resource(show_spinner=False)
+def _plan_model(model_size):
+    """
+    Plan the model size and compute type once per requested size.
+    
+    Planning against the free GPU memory before anything is loaded keeps later
+    reruns from downgrading because of memory the cached model already holds.
+    """
+    return plan_model(model_size)
+
+
+@st.cache_resource(show_spinner=False)
+def _load_model(model_size, compute_type):
+    """Load the Whisper model once per model size and compute type for the lifetime of the app."""
+    return load_model(model_size, compute_type)
+
+
+@st.cache_data(persist="disk", show_spinner=False)
+def _cached_transcribe(video_id, model_size, compute_type, _youtube_url, _on_segment=None):
+    """Download and transcribe a video once per video ID and loaded model configuration."""
+    # Download the audio in the background while the model weights load
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        download = pool.submit(fetch_audio, _youtube_url)
+        model = _load_model(model_size, compute_type)
+        audio_path, video_info = download.result()
+    
+    agent = YouTubeTranscriptAgent(model_size=model_size, model=model)
+    segments = []
+    for segment in agent.transcribe_audio_stream(audio_path):
+        segments.append(segment)
+        if _on_segment is not None:
+            _on_segment(segment)
+    return {'video_info': video_info, 'segments': segments}
+
+
+def _stream_transcribe(video_id, model_size, compute_type, youtube_url, placeholder):
+    """
+    Run the cached transcription in a worker thread, showing segments as they arrive.
+    
+    Cached functions must not draw Streamlit elements themselves, so new segments
+    are passed back through a queue and rendered from the script thread.
+    """
+    segments = queue.Queue()
+    lines = []
+    stale = False
+    last_draw = 0.0
+    
+    # The worker shares this script run's context so the model cache works from it
+    ctx = get_script_run_ctx()
+    with ThreadPoolExecutor(max_workers=1, initializer=add_script_run_ctx, initargs=(None, ctx)) as pool:
+        job = pool.submit(_cached_transcribe, video_id, model_size, compute_type, youtube_url, segments.put)
+        # Keep draining until the worker has finished and every queued segment is drawn
+        while not (job.done() and segments.empty()):
+            try:
+                segment = segments.get(timeout=STREAM_REFRESH_SECONDS)
+            except queue.Empty:
+                segment = None
+            
+            # Segments arrive in bursts, so take everything already queued at once
+            while segment is not None:
+                lines.append(f"[{format_timestamp(segment['start'])}] {segment['text']}")
+                stale = True
+                try:
+                    segment = segments.get_nowait()
+                except queue.Empty:
+                    segment = None
+            
+            # Each redraw resends the whole preview, so redraw at most once per interval
+            if stale and time.monotonic() - last_draw >= STREAM_REFRESH_SECONDS:
+                placeholder.text("\n".join(lines))
+                stale = False
+                last_draw = time.monotonic()
+    
+    if stale:
+        placeholder.text("\n".join(lines))
+    return job.result()
 
 
 def main():
@@ -44,15 +141,23 @@ def main():
         if st.button("Generate Transcript"):
             if youtube_url:
                 try:
-                    with st.spinner("Initializing Whisper model..."):
-                        st.session_state.agent = YouTubeTranscriptAgent(model_size=model_size)
-                    
-                    with st.spinner("Downloading audio..."):
-                        audio_path = st.session_state.agent.download_audio(youtube_url)
+                    # Transcripts are cached under the model actually loaded, which may be
+                    # smaller than the one selected when GPU memory is short
+                    planned_size, compute_type, notice = _plan_model(model_size)
+                    if notice:
+                        st.warning(notice)
                     
-                    with st.spinner("Transcribing audio... This may take a few minutes."):
-                        st.session_state.agent.transcribe_audio(audio_path)
+                    with st.status("Downloading and transcribing audio... This may take a few minutes.", expanded=True) as status:
+                        # Repeat requests for the same video and model reuse the cached transcript
+                        video_id = extract_video_id(youtube_url) or youtube_url
+                        transcript = _stream_transcribe(video_id, planned_size, compute_type, youtube_url, st.empty())
+                        # The display agent never transcribes, so it is built without loading a model
+                        agent = YouTubeTranscriptAgent(model_size=planned_size)
+                        status.update(label="Transcription complete", state="complete", expanded=False)
                     
+                    agent.video_info = transcript['video_info']
+                    agent.load_transcript(transcript['segments'])
+                    st.session_state.agent = agent
                     st.session_state.transcript_generated = True
                     st.session_state.video_info = st.session_state.agent.video_info
                     st.success("Transcript generated successfully!")
@@ -114,17 +219,11 @@ def main():
                     display_df.columns = ['Timestamp', 'Text']
                     
                     # Add YouTube time links
-                    video_id = None
-                    if "youtube.com/watch" in st.session_state.video_info.get('url', ''):
-                        video_id = st.session_state.video_info.get('url', '').split("v=")[1].split("&")[0]
-                    elif "youtu.be/" in st.session_state.video_info.get('url', ''):
-                        video_id = st.session_state.video_info.get('url', '').split("youtu.be/")[1].split("?")[0]
+                    video_id = extract_video_id(st.session_state.video_info.get('url', ''))
                     
                     if video_id:
-                        display_df['Link'] = display_df.apply(
-                            lambda row: f"[Go to timestamp](https://www.youtube.com/watch?v={video_id}&t={int(matches.loc[row.name, 'start'])}s)", 
-                            axis=1
-                        )
+                        seconds = matches['start'].astype(int).astype(str)
+                        display_df['Link'] = f"[Go to timestamp](https://www.youtube.com/watch?v={video_id}&t=" + seconds + "s)"
                     
                     st.dataframe(display_df, use_container_width=True)
                 else:
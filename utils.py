@@ -1,25 +1,290 @@
 import os
 import re
+import functools
+import shutil
 import yt_dlp as youtube_dl
 import time
-import whisper
+import torch
+import ctranslate2
+from faster_whisper import BatchedInferencePipeline, WhisperModel
 from datetime import timedelta
+from urllib.parse import parse_qs, unquote, urlparse
+import numpy as np
 import pandas as pd
-from nltk.tokenize import sent_tokenize
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+from nltk.tokenize import PunktTokenizer
 import streamlit as st
 
+# Whisper models operate on 16 kHz mono audio
+SAMPLE_RATE = 16000
+
+# Length of the silent clip decoded when a model is loaded onto the GPU
+WARMUP_SECONDS = 1
+
+# Rough GPU memory needed per item in a transcription batch, and the cap on batch size
+BATCH_ITEM_MEMORY_GB = 0.5
+MAX_BATCH_SIZE = 16
+CPU_BATCH_SIZE = 8
+
+# Whisper model sizes from smallest to largest, with their parameter counts
+MODEL_PARAMS = {
+    'tiny': 39e6,
+    'base': 74e6,
+    'small': 244e6,
+    'medium': 769e6,
+    'large': 1550e6,
+}
+
+# Bytes per weight for each compute type, and headroom for activations and the CUDA context
+BYTES_PER_PARAM = {'float32': 4, 'float16': 2, 'int8_float16': 1, 'int8': 1}
+MODEL_MEMORY_OVERHEAD = 2.0
+
+# Use aria2c for multi-connection downloads when it is installed
+ARIA2C_AVAILABLE = shutil.which("aria2c") is not None
+ARIA2C_ARGS = ['-x', '16', '-s', '16', '-k', '1M', '--file-allocation=none']
+
+# TextRank damping factor and number of power iterations
+TEXTRANK_DAMPING = 0.85
+TEXTRANK_ITERATIONS = 30
+
+# YouTube video IDs, and where they appear in the path of embed, shorts, live and youtu.be URLs
+_VIDEO_ID_RE = re.compile(r'[A-Za-z0-9_-]{11}')
+_VIDEO_PATH_RE = re.compile(r'(?:/(?:embed|shorts|live|v)/|youtu\.be/)([A-Za-z0-9_-]{11})(?![A-Za-z0-9_-])')
+
+# Characters that give a search query regex meaning
+_REGEX_METACHARS = re.compile(r"[.^$*+?{}\[\]\\|()]")
+
+@functools.lru_cache(maxsize=128)
+def _compile_ci(pattern):
+    """Compile a case-insensitive regex, reusing earlier compilations."""
+    return re.compile(pattern, re.IGNORECASE)
+
+@functools.lru_cache(maxsize=None)
+def _punkt_tokenizer():
+    """Load the English Punkt sentence tokenizer once per process."""
+    return PunktTokenizer()
+
+def _textrank_scores(sentences):
+    """Score sentences with TextRank over their TF-IDF cosine similarities."""
+    # TF-IDF rows are L2-normalized, so the sparse product is cosine similarity
+    vectors = TfidfVectorizer().fit_transform(sentences)
+    similarity = (vectors @ vectors.T).tocsr()
+    similarity = similarity - sp.diags(similarity.diagonal())
+    
+    # Row-normalize into a transition matrix, leaving isolated sentences at zero
+    row_sums = np.asarray(similarity.sum(axis=1)).ravel()
+    row_sums[row_sums == 0] = 1
+    transition_t = (sp.diags(1 / row_sums) @ similarity).T.tocsr()
+    
+    # PageRank by power iteration
+    count = len(sentences)
+    scores = np.full(count, 1 / count)
+    for _ in range(TEXTRANK_ITERATIONS):
+        scores = (1 - TEXTRANK_DAMPING) / count + TEXTRANK_DAMPING * (transition_t @ scores)
+    return scores
+
+def _format_timestamps(seconds):
+    """Format an array of second offsets as h:mm:ss strings in one vectorized pass."""
+    if seconds.size == 0:
+        return []
+    hours, remainder = np.divmod(seconds.astype(np.int64), 3600)
+    minutes, secs = np.divmod(remainder, 60)
+    formatted = np.char.add(hours.astype(str), ":")
+    formatted = np.char.add(formatted, np.char.zfill(minutes.astype(str), 2))
+    formatted = np.char.add(formatted, ":")
+    formatted = np.char.add(formatted, np.char.zfill(secs.astype(str), 2))
+    return formatted.tolist()
+
+def _select_batch_size(device):
+    """Pick a batch size that fits in the currently free GPU memory."""
+    if device != "cuda":
+        return CPU_BATCH_SIZE
+    free_bytes, _ = torch.cuda.mem_get_info()
+    batch_size = int(free_bytes / 1024**3 / BATCH_ITEM_MEMORY_GB)
+    return max(1, min(MAX_BATCH_SIZE, batch_size))
+
+def _quantized_compute_type(device):
+    """Return the best supported type with 8-bit weights, or float32 if there is none."""
+    if device != "cuda":
+        return "int8"
+    supported = ctranslate2.get_supported_compute_types("cuda")
+    # Keep float16 activations where possible; plain int8 computes in float32
+    if "int8_float16" in supported:
+        return "int8_float16"
+    # CTranslate2's CUDA int8 kernels need compute capability 6.1 or newer
+    if "int8" in supported:
+        return "int8"
+    return "float32"
+
+def _select_compute_type(device):
+    """Pick the fastest numeric type the device supports for inference."""
+    if device != "cuda":
+        return "int8"
+    major, _ = torch.cuda.get_device_capability()
+    # Ampere and newer run int8 weights with float16 activations on tensor cores
+    if major >= 8 and "int8_float16" in ctranslate2.get_supported_compute_types("cuda"):
+        return "int8_float16"
+    # Volta and Turing have float16 tensor cores; older cards fall back to int8 where supported
+    if major >= 7:
+        return "float16"
+    return _quantized_compute_type(device)
+
+def _model_memory_gb(model_size, compute_type):
+    """Estimate the GPU memory in GB needed to run a model."""
+    weights = MODEL_PARAMS[model_size] * BYTES_PER_PARAM[compute_type]
+    return weights * MODEL_MEMORY_OVERHEAD / 1024**3
+
+def _max_feasible_model(free_gb, compute_type):
+    """Return the largest model size that fits in free_gb, or None if none do."""
+    feasible = [size for size in MODEL_PARAMS if _model_memory_gb(size, compute_type) <= free_gb]
+    return feasible[-1] if feasible else None
+
+def plan_model(model_size="base"):
+    """
+    Choose the model size and compute type to load, given the free GPU memory.
+    
+    A model that does not fit is first switched to 8-bit weights (where the GPU
+    supports them), then replaced by the largest smaller model that fits.
+    
+    Args:
+        model_size (str): Requested Whisper model size
+        
+    Returns:
+        tuple: Model size, compute type, and a message describing any downgrade (or None)
+    """
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    compute_type = _select_compute_type(device)
+    if device != "cuda" or model_size not in MODEL_PARAMS:
+        return model_size, compute_type, None
+    
+    free_gb = torch.cuda.mem_get_info()[0] / 1024**3
+    if _model_memory_gb(model_size, compute_type) <= free_gb:
+        return model_size, compute_type, None
+    
+    # A compute type that already stores 1 byte per weight is kept as is
+    if BYTES_PER_PARAM[compute_type] == 1:
+        quantized = compute_type
+    else:
+        quantized = _quantized_compute_type(device)
+    if (BYTES_PER_PARAM[quantized] < BYTES_PER_PARAM[compute_type]
+            and _model_memory_gb(model_size, quantized) <= free_gb):
+        return model_size, quantized, (
+            f"Only {free_gb:.1f} GB of GPU memory is free, so the {model_size} model "
+            f"is running with {quantized} weights."
+        )
+    
+    fallback = _max_feasible_model(free_gb, quantized) or "tiny"
+    return fallback, quantized, (
+        f"Only {free_gb:.1f} GB of GPU memory is free, so the {fallback} model "
+        f"is being used instead of {model_size}."
+    )
+
+def load_model(model_size="base", compute_type=None):
+    """
+    Load a Whisper model on the best available device.
+    
+    Args:
+        model_size (str): Size of the Whisper model to use ('tiny', 'base', 'small', 'medium', 'large')
+        compute_type (str): Numeric type for inference, picked from the device if None
+        
+    Returns:
+        WhisperModel: Loaded model
+    """
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    if compute_type is None:
+        compute_type = _select_compute_type(device)
+    model = WhisperModel(model_size, device=device, compute_type=compute_type)
+    
+    # Decode a short silent clip so CUDA kernel and allocator setup happens at load
+    # time rather than during the first real transcription
+    if device == "cuda":
+        segments, _ = model.transcribe(np.zeros(SAMPLE_RATE * WARMUP_SECONDS, dtype=np.float32), beam_size=5)
+        list(segments)
+    
+    return model
+
+def fetch_audio(youtube_url, output_dir=None):
+    """
+    Download audio from a YouTube video using yt-dlp.
+    
+    Args:
+        youtube_url (str): URL of the YouTube video
+        output_dir (str): Directory to save the downloaded audio
+        
+    Returns:
+        tuple: Path to the downloaded audio file and a dict of video information
+    """
+    if output_dir is None:
+        output_dir = os.path.join(os.getcwd(), "audio")
+    
+    # Create output directory if it doesn't exist
+    os.makedirs(output_dir, exist_ok=True)
+    
+    # Configure yt-dlp options; the native audio stream is kept as-is since
+    # Whisper resamples it to 16 kHz mono anyway, so no re-encode is needed.
+    # Files are named by yt-dlp's own video ID so different videos never collide
+    ydl_opts = {
+        'format': 'bestaudio[ext=m4a]/bestaudio/best',
+        'outtmpl': os.path.join(output_dir, '%(id)s.%(ext)s'),
+        'noplaylist': True,
+        'quiet': True,
+        'no_warnings': True,
+    }
+    if ARIA2C_AVAILABLE:
+        ydl_opts['external_downloader'] = {'default': 'aria2c'}
+        ydl_opts['external_downloader_args'] = {'aria2c': ARIA2C_ARGS}
+    
+    try:
+        # Fetch the metadata and the audio in a single pass
+        with youtube_dl.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(youtube_url, download=True)
+            
+            # The extension depends on which audio stream yt-dlp selected
+            output_file = ydl.prepare_filename(info)
+        
+        # Collect video information
+        video_info = {
+            'title': info.get('title', 'Unknown'),
+            'author': info.get('uploader', 'Unknown'),
+            'publish_date': info.get('upload_date', 'Unknown'),
+            'views': info.get('view_count', 0),
+            'length': info.get('duration', 0),
+            'url': youtube_url,
+            'thumbnail_url': info.get('thumbnail', '')
+        }
+        
+        return output_file, video_info
+        
+    except Exception as e:
+        raise Exception(f"Error downloading video: {str(e)}")
+
 class YouTubeTranscriptAgent:
-    def __init__(self, model_size="base"):
+    def __init__(self, model_size="base", model=None):
         """
         Initialize the YouTube Transcript Agent.
         
         Args:
             model_size (str): Size of the Whisper model to use ('tiny', 'base', 'small', 'medium', 'large')
+            model (WhisperModel): Already loaded model to reuse; if None, model_size is
+                loaded on the first transcription
         """
-        self.model = whisper.load_model(model_size)
-        self.transcript_df = None
+        self.model_size = model_size
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.model = model
+        self.pipeline = None
         self.video_info = {}
         
+        # Transcript segments stored column-wise, one entry per segment
+        self.starts = None
+        self.ends = None
+        self.texts = None
+        self.start_strs = None
+        
+        # Sentence split and TextRank order, computed on the first summary
+        self._sentences = None
+        self._sentence_ranking = None
+        
     def download_audio(self, youtube_url, output_dir=None):
         """
         Download audio from a YouTube video using yt-dlp.
@@ -31,69 +296,81 @@ class YouTubeTranscriptAgent:
         Returns:
             str: Path to the downloaded audio file
         """
-        if output_dir is None:
-            output_dir = os.path.join(os.getcwd(), "audio")
-        
-        # Create output directory if it doesn't exist
-        os.makedirs(output_dir, exist_ok=True)
+        output_file, self.video_info = fetch_audio(youtube_url, output_dir)
+        return output_file
+    
+    def transcribe_audio_stream(self, audio_path):
+        """
+        Transcribe audio file using Whisper, yielding segments as they are decoded.
         
-        # Extract video ID from the URL
-        video_id = None
-        if "youtube.com/watch" in youtube_url:
-            video_id = youtube_url.split("v=")[1].split("&")[0]
-        elif "youtu.be/" in youtube_url:
-            video_id = youtube_url.split("youtu.be/")[1].split("?")[0]
-        else:
-            video_id = "video"  # Fallback name
+        Args:
+            audio_path (str): Path to the audio file
             
-        output_file = os.path.join(output_dir, f"{video_id}")
-        
-        # Configure yt-dlp options
-        ydl_opts = {
-            'format': 'bestaudio/best',
-            'outtmpl': output_file,
-            'noplaylist': True,
-            'quiet': True,
-            'no_warnings': True,
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '192',
-            }],
-        }
+        Yields:
+            dict: Segment with 'start', 'end' and 'text' keys
+        """
+        # Load the model only when there is something to transcribe, so agents
+        # that just display a cached transcript never touch the weights
+        if self.pipeline is None:
+            if self.model is None:
+                self.model = load_model(self.model_size)
+            self.pipeline = BatchedInferencePipeline(model=self.model)
         
-        # Download video info first
-        info_opts = {
-            'quiet': True,
-            'no_warnings': True,
-        }
+        # Decode VAD-split chunks of the audio in parallel batches
+        segments, _ = self.pipeline.transcribe(
+            audio_path,
+            beam_size=5,
+            batch_size=_select_batch_size(self.device),
+            vad_filter=True
+        )
         
-        try:
-            with youtube_dl.YoutubeDL(info_opts) as ydl:
-                info = ydl.extract_info(youtube_url, download=False)
-                
-                # Store video information
-                self.video_info = {
-                    'title': info.get('title', 'Unknown'),
-                    'author': info.get('uploader', 'Unknown'),
-                    'publish_date': info.get('upload_date', 'Unknown'),
-                    'views': info.get('view_count', 0),
-                    'length': info.get('duration', 0),
-                    'url': youtube_url,
-                    'thumbnail_url': info.get('thumbnail', '')
-                }
-            
-            # Now download the audio
-            with youtube_dl.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([youtube_url])
-                
-            # The actual filename might be different because of yt-dlp's processing
-            output_file = os.path.join(output_dir, f"{video_id}.mp3")
-            
-            return output_file
-            
-        except Exception as e:
-            raise Exception(f"Error downloading video: {str(e)}")
+        # The segments generator decodes lazily as it is consumed
+        for segment in segments:
+            yield {'start': segment.start, 'end': segment.end, 'text': segment.text.strip()}
+    
+    def load_transcript(self, segments):
+        """
+        Load transcript segments into the agent.
+        
+        Args:
+            segments (list): Segment dicts with 'start', 'end' and 'text' keys
+        """
+        count = len(segments)
+        starts = np.fromiter((segment['start'] for segment in segments), dtype=np.float64, count=count)
+        self.starts = starts.astype(np.float32)
+        self.ends = np.fromiter((segment['end'] for segment in segments), dtype=np.float32, count=count)
+        self.texts = np.array([segment['text'] for segment in segments], dtype=object)
+        self.start_strs = _format_timestamps(starts)
+        self._sentences = None
+        self._sentence_ranking = None
+    
+    @property
+    def transcript_df(self):
+        """DataFrame view of the transcript, or None if nothing is loaded."""
+        if self.texts is None:
+            return None
+        return self._segments_frame(np.arange(len(self.texts)))
+    
+    def _segments_frame(self, indices):
+        """Build a DataFrame of the segments at the given indices."""
+        return pd.DataFrame({
+            'start': self.starts[indices],
+            'end': self.ends[indices],
+            'start_str': [self.start_strs[i] for i in indices],
+            'text': self.texts[indices]
+        }, index=indices)
+    
+    def _match_indices(self, query):
+        """Return the indices of segments whose text matches the query."""
+        if _REGEX_METACHARS.search(query):
+            pattern = _compile_ci(query)
+            matched = (pattern.search(text) is not None for text in self.texts)
+        else:
+            # Plain words need no regex engine, a substring check is enough
+            needle = query.lower()
+            matched = (needle in text.lower() for text in self.texts)
+        mask = np.fromiter(matched, dtype=bool, count=len(self.texts))
+        return np.flatnonzero(mask)
     
     def transcribe_audio(self, audio_path):
         """
@@ -105,20 +382,12 @@ class YouTubeTranscriptAgent:
         Returns:
             dict: Transcription result
         """
-        result = self.model.transcribe(audio_path, fp16=False)
-        
-        # Create DataFrame from segments
-        data = []
-        for segment in result['segments']:
-            data.append({
-                'start': segment['start'],
-                'end': segment['end'],
-                'start_str': str(timedelta(seconds=int(segment['start']))),
-                'text': segment['text'].strip()
-            })
-        
-        self.transcript_df = pd.DataFrame(data)
-        return result
+        segments = list(self.transcribe_audio_stream(audio_path))
+        self.load_transcript(segments)
+        return {
+            'text': " ".join(segment['text'] for segment in segments),
+            'segments': segments
+        }
     
     def search_transcript(self, query):
         """
@@ -130,18 +399,15 @@ class YouTubeTranscriptAgent:
         Returns:
             DataFrame: Matching segments
         """
-        if self.transcript_df is None:
+        if self.texts is None:
             st.error("No transcript available. Please transcribe a video first.")
             return None
         
-        pattern = re.compile(query, re.IGNORECASE)
-        matches = self.transcript_df[self.transcript_df['text'].str.contains(pattern)]
-        
-        return matches
+        return self._segments_frame(self._match_indices(query))
     
     def summarize_transcript(self, num_sentences=5):
         """
-        Generate a simple extractive summary of the transcript.
+        Generate an extractive summary of the transcript using TextRank.
         
         Args:
             num_sentences (int): Number of sentences to include in summary
@@ -149,22 +415,28 @@ class YouTubeTranscriptAgent:
         Returns:
             str: Summary text
         """
-        if self.transcript_df is None:
+        if self.texts is None:
             st.error("No transcript available. Please transcribe a video first.")
             return None
         
-        # Combine all transcript text
-        full_text = " ".join(self.transcript_df['text'].tolist())
-        
-        # Split into sentences
-        sentences = sent_tokenize(full_text)
+        if self._sentences is None:
+            # Combine all transcript text and split it into sentences
+            self._sentences = _punkt_tokenizer().tokenize(" ".join(self.texts))
+        sentences = self._sentences
         
-        # For this simple implementation, just take the first few sentences
-        # A more sophisticated approach would use TextRank or another algorithm
         if num_sentences >= len(sentences):
-            summary = " ".join(sentences)
-        else:
-            summary = " ".join(sentences[:num_sentences])
+            return " ".join(sentences)
+        
+        if self._sentence_ranking is None:
+            try:
+                self._sentence_ranking = np.argsort(-_textrank_scores(sentences), kind="stable")
+            except ValueError:
+                # No scorable words (e.g. only punctuation), fall back to the opening sentences
+                self._sentence_ranking = np.arange(len(sentences))
+        
+        # Take the highest ranked sentences, kept in their original order
+        top = np.sort(self._sentence_ranking[:num_sentences])
+        summary = " ".join(sentences[i] for i in top)
         
         return summary
     
@@ -178,11 +450,11 @@ class YouTubeTranscriptAgent:
         Returns:
             list: List of (timestamp, text) tuples
         """
-        matches = self.search_transcript(query)
-        if matches is None or len(matches) == 0:
+        if self.texts is None:
+            st.error("No transcript available. Please transcribe a video first.")
             return []
         
-        timestamps = [(row['start_str'], row['text']) for _, row in matches.iterrows()]
+        timestamps = [(self.start_strs[i], self.texts[i]) for i in self._match_indices(query)]
         return timestamps
     
     def get_full_transcript(self):
@@ -192,14 +464,20 @@ class YouTubeTranscriptAgent:
         Returns:
             str: Formatted transcript
         """
-        if self.transcript_df is None:
+        if self.texts is None:
             return "No transcript available."
         
-        transcript_text = ""
-        for _, row in self.transcript_df.iterrows():
-            transcript_text += f"[{row['start_str']}] {row['text']}\n"
+        if len(self.texts) == 0:
+            return ""
         
-        return transcript_text
+        # Format every line with vectorized string ops over the arrays and join once
+        lines = np.char.add(np.char.add("[", self.start_strs), "] ")
+        lines = np.char.add(lines, self.texts.astype(str))
+        return "\n".join(lines) + "\n"
+
+def format_timestamp(seconds):
+    """Format seconds as an h:mm:ss transcript timestamp."""
+    return _format_timestamps(np.array([seconds]))[0]
 
 def format_time(seconds):
     """Format seconds to mm:ss or hh:mm:ss."""
@@ -211,16 +489,22 @@ def format_time(seconds):
         minutes, seconds = divmod(remainder, 60)
         return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
 
-def create_youtube_embed_url(youtube_url):
-    """Convert a YouTube video URL to an embedded URL."""
-    video_id = None
+@functools.lru_cache(maxsize=128)
+def extract_video_id(youtube_url):
+    """Extract the video ID from a YouTube URL, or None if it has none."""
+    parsed = urlparse(youtube_url.strip())
     
-    # Extract video ID from URL
-    if "youtube.com/watch" in youtube_url:
-        video_id = youtube_url.split("v=")[1].split("&")[0]
-    elif "youtu.be/" in youtube_url:
-        video_id = youtube_url.split("youtu.be/")[1].split("?")[0]
+    # Watch URLs carry the ID in the v= query parameter, wherever it appears
+    for video_id in parse_qs(parsed.query).get('v', []):
+        if _VIDEO_ID_RE.fullmatch(video_id):
+            return video_id
     
+    match = _VIDEO_PATH_RE.search(unquote(parsed.netloc + parsed.path))
+    return match.group(1) if match else None
+
+def create_youtube_embed_url(youtube_url):
+    """Convert a YouTube video URL to an embedded URL."""
+    video_id = extract_video_id(youtube_url)
     if video_id:
         return f"https://www.youtube.com/embed/{video_id}"
     return None
\ No newline at end of file